@@ -12,6 +12,7 @@ setuptools.setup(
     package_data={'': ['*.ini']},
     packages=setuptools.find_packages(),
     install_requires=['lxml', 'py'],
+    extras_require={'json': ['orjson'], 'uvloop': ['uvloop'], 'cache': ['msgpack']},
     url="https://github.com/naveenraju23/simpleshark",
     long_description=long_description,
     long_description_content_type="text/markdown",
@@ -1,17 +1,39 @@
 import asyncio
+import collections
+import functools
+import itertools
 import os
 import threading
 import subprocess
 import concurrent.futures
 import sys
 import logging
-from distutils.version import LooseVersion
 
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+try:
+    import uvloop
+except ImportError:
+    uvloop = None
+
+from simpleshark.capture import packet_cache
+from simpleshark.capture.stream_buffer import StreamBuffer
 from simpleshark.tshark.tshark import get_process_path, get_tshark_display_filter_flag, \
     tshark_supports_json, TSharkVersionException, get_tshark_version
+from simpleshark.tshark.tshark_json import packet_from_json_packet, packet_from_ek_packet
 from simpleshark.tshark.tshark_xml import packet_from_xml_packet, psml_structure_from_xml
 
 
+# fcntl.F_SETPIPE_SZ is only defined from Python 3.10
+F_SETPIPE_SZ = getattr(fcntl, "F_SETPIPE_SZ", 1031)
+
+# uvloop eventloops used by the captures of each thread
+_uvloop_eventloops = threading.local()
+
+
 class TSharkCrashException(Exception):
     pass
 
@@ -31,12 +53,128 @@ class StopCapture(Exception):
     pass
 
 
+def _parse_packets(parse_packet, raw_packets):
+    """Parses a batch of raw packets, a single work item of the parse pool."""
+    return [parse_packet(raw_packet) for raw_packet in raw_packets]
+
+
+class _PacketReader(object):
+    """
+    Reads and parses the packets of a tshark output stream, one chunk of packets per read_packets() call.
+
+    Each call is a coroutine of its own which returns as soon as it has packets, instead of a task going through the
+    whole stream. Nothing is then left waiting on the stream (and holding on to the capture) between calls.
+    """
+
+    def __init__(self, capture, fd, packet_count=None):
+        self._capture = capture
+        self._fd = fd
+        self._packet_count = packet_count
+        self._data = None
+        self._parse_packet = None
+        self._cache_writer = None
+        self._packets_read = 0
+        self._raw_packets = []
+        self._parsing = collections.deque()
+        self._batch_size = capture.PARSE_BATCH_SIZE if capture._parse_processes else 1
+        self._max_parsing = 2 * capture._parse_processes if capture._parse_processes else 1
+        self._reading = True
+        self._reached_eof = False
+
+    async def read_packets(self):
+        """
+        Returns the packets parsed from the data read so far, reading more data only if there are none.
+        Returns an empty list once all the packets were read.
+        """
+        if self._data is None:
+            await self._start()
+        while True:
+            packets = [packet for packet in await self._read_parsed_packets() if packet]
+            if packets or not self._reading:
+                break
+        if self._cache_writer is not None:
+            for packet in packets:
+                self._cache_writer.write(packet)
+            if not packets and self._reached_eof:
+                self._cache_writer.commit()
+                self._cache_writer = None
+        return packets
+
+    def close(self):
+        for future in self._parsing:
+            future.cancel()
+        self._parsing.clear()
+        if self._cache_writer is not None:
+            # The capture was not read until its end
+            self._cache_writer.discard()
+            self._cache_writer = None
+
+    async def _start(self):
+        capture = self._capture
+        psml_struct, self._data = await capture._get_psml_struct(self._fd)
+        self._parse_packet = capture._get_packet_parser(psml_struct)
+        if capture._cache_path and not self._packet_count:
+            cache_options = capture._get_cache_options()
+            if not packet_cache.is_cache_valid(capture._cache_path, capture.input_filename, cache_options):
+                self._cache_writer = packet_cache.PacketCacheWriter(capture._cache_path, cache_options)
+
+    async def _read_parsed_packets(self):
+        capture = self._capture
+        packets = []
+        while self._reading:
+            if self._packet_count and self._packets_read >= self._packet_count:
+                self._reading = False
+                break
+            raw_packet, self._data = capture._extract_raw_packet_from_data(self._data,
+                                                                           got_first_packet=self._packets_read > 0)
+            if raw_packet is not None:
+                self._raw_packets.append(raw_packet)
+                self._packets_read += 1
+                if len(self._raw_packets) >= self._batch_size:
+                    packets.extend(await self._parse_raw_packets())
+                continue
+
+            # There are no more complete packets in the data read so far
+            if self._raw_packets:
+                packets.extend(await self._parse_raw_packets())
+            if packets:
+                break
+            new_data = await self._fd.read(capture.DEFAULT_BATCH_SIZE)
+            if not new_data:
+                capture._log.debug("EOF reached")
+                self._reading = False
+                self._reached_eof = True
+            self._data.feed(new_data)
+
+        if not self._reading:
+            if self._raw_packets:
+                self._parsing.append(capture._parse_packets_async(self._parse_packet, self._raw_packets))
+                self._raw_packets = []
+            while self._parsing:
+                packets.extend(await self._parsing.popleft())
+        return packets
+
+    async def _parse_raw_packets(self):
+        """
+        Starts parsing the pending raw packets, and returns the packets of the oldest batch being parsed once there
+        are too many batches being parsed (an empty list otherwise).
+        """
+        self._parsing.append(self._capture._parse_packets_async(self._parse_packet, self._raw_packets))
+        self._raw_packets = []
+        if len(self._parsing) >= self._max_parsing:
+            return await self._parsing.popleft()
+        return []
+
+
 class FileCapture(object):
     """
     A class representing a capture read from a file.
     """
-    DEFAULT_BATCH_SIZE = 2 ** 16
+    DEFAULT_BATCH_SIZE = 2 ** 20
+    STREAM_LIMIT = 2 ** 22
+    PIPE_SIZE = 2 ** 20
     SUMMARIES_BATCH_SIZE = 64
+    PARSE_BATCH_SIZE = 256
     DEFAULT_LOG_LEVEL = logging.CRITICAL
     SUPPORTED_ENCRYPTION_STANDARDS = ["wep", "wpa-pwk", "wpa-pwd", "wpa-psk"]
 
@@ -44,7 +182,8 @@ class FileCapture(object):
                  decryption_key=None, encryption_type="wpa-pwd", output_file=None,
                  decode_as=None,  disable_protocol=None, tshark_path=None,
                  override_prefs=None, capture_filter=None, use_json=False, include_raw=False,
-                 custom_parameters=None, debug=False):
+                 custom_parameters=None, debug=False, parse_processes=None, use_ek=False, protocols=None,
+                 cache_path=None):
         """
         Creates a packet capture object by reading from file.
 
@@ -62,10 +201,21 @@ class FileCapture(object):
         :param tshark_path: Path of the tshark binary
         :param override_prefs: A dictionary of tshark preferences to override, {PREFERENCE_NAME: PREFERENCE_VALUE, ...}.
         :param disable_protocol: Tells tshark to remove a dissector for a specific protocol.
-        :param use_json: Uses tshark in JSON mode (EXPERIMENTAL). It is a good deal faster than XML
-        but also has less information. Available from Wireshark 2.2.0.
+        :param use_json: Uses tshark in JSON mode. It is a good deal faster than XML (especially with orjson
+        installed) but also has less information, e.g. fields have no showname, size or position.
+        Available from Wireshark 2.2.0.
+        :param use_ek: Uses tshark in elastic (-T ek) mode, which outputs a JSON object per line and is the fastest
+        to split into packets. Implies use_json. The fields of each layer are flattened, e.g. the df flag of ip is
+        named flags_df.
+        :param protocols: A list of protocols, e.g. ["ip", "udp"], to limit the JSON/EK output of tshark to, which makes
+        it faster to produce and parse. Any other protocol (except frame) and its fields are dropped from the packets.
+        :param cache_path: If given, the packets parsed by a full read of the capture are saved to this file (requires
+        msgpack), and iterating the capture reads them from it rather than running tshark, as long as the file is newer
+        than the capture and was written with the same options.
         :param output_file: A string of a file to write every read packet into (useful when filtering).
         :param custom_parameters: A dict of custom parameters to pass to tshark, i.e. {"--param": "value"}
+        :param parse_processes: If given, packets are parsed by a pool of this many worker processes while tshark
+        output keeps being read, instead of one by one in the current process.
         """
 
         self.loaded = False
@@ -81,7 +231,8 @@ class FileCapture(object):
         self.tshark_path = tshark_path
         self._override_prefs = override_prefs
         self.debug = debug
-        self.use_json = use_json
+        self.use_json = use_json or use_ek
+        self.use_ek = use_ek
         self.include_raw = include_raw
         self._packets = []
         self._current_packet = 0
@@ -96,9 +247,19 @@ class FileCapture(object):
         self._closed = False
         self._custom_parameters = custom_parameters
         self.__tshark_version = None
-
-        if include_raw and not use_json:
+        self.__tshark_path = None
+        self._json_separators = None
+        self._key_memo = {}
+        self._parse_processes = parse_processes
+        self._protocols = protocols
+        self._cache_path = cache_path
+        self._packet_store = None
+        self._parse_pool = None
+
+        if include_raw and not self.use_json:
             raise RawMustUseJsonException("use_json must be True if include_raw")
+        if cache_path and packet_cache.msgpack is None:
+            raise ImportError("msgpack must be installed to use cache_path")
 
         if self.debug:
             self.set_debug()
@@ -112,7 +273,12 @@ class FileCapture(object):
             raise UnknownEncyptionStandardException("Only the following standards are supported: %s."
                                                     % ", ".join(self.SUPPORTED_ENCRYPTION_STANDARDS))
 
-        self._packet_generator = self._packets_from_tshark_sync()
+        if self.use_json and not self.use_ek:
+            # Computed once here rather than per packet. The tshark version lookup is cached between captures.
+            self._json_separators = self._get_json_separators(self._get_tshark_version())
+
+        # Created on first use, and shared by next(), __getitem__ and __iter__
+        self._packet_generator = None
 
     def __getitem__(self, packet_index):
         """
@@ -122,7 +288,12 @@ class FileCapture(object):
         :return: Packet object.
         """
         if not self.keep_packets:
-            raise NotImplementedError("Cannot use getitem if packet are not kept")
+            if self._packet_store is None:
+                raise NotImplementedError("Cannot use getitem if packet are not kept, unless loaded by load_packets")
+            try:
+                return self._packet_store[packet_index]
+            except IndexError:
+                raise KeyError('Packet of index %d does not exist in capture' % packet_index)
             # We may not yet have this packet
         while packet_index >= len(self._packets):
             try:
@@ -133,6 +304,8 @@ class FileCapture(object):
         return self._packets[packet_index]
 
     def __len__(self):
+        if not self.keep_packets and self._packet_store is not None:
+            return len(self._packet_store)
         return len(self._packets)
 
     def next(self):
@@ -141,12 +314,24 @@ class FileCapture(object):
         If the capture's keep_packets flag is True, will also keep it in the internal packet list.
         """
         if not self.keep_packets:
-            return self._packet_generator.send(None)
-        elif self._current_packet >= len(self._packets):
-            packet = self._packet_generator.send(None)
-            self._packets += [packet]
+            if self._packet_store is not None:
+                # Packets loaded by load_packets are read back from the store, reset() starts over from the first one.
+                if self._current_packet >= len(self._packet_store):
+                    raise StopIteration()
+                self._current_packet += 1
+                return self._packet_store[self._current_packet - 1]
+            return self._get_packet_generator().send(None)
+        elif self._current_packet >= len(self._packets) and not self.loaded:
+            # Packets added by load_packets were read by their own tshark process, there is nothing more to read.
+            packet = self._get_packet_generator().send(None)
+            self._packets.append(packet)
         return self.next_packet()
 
+    def _get_packet_generator(self):
+        if self._packet_generator is None:
+            self._packet_generator = self._packets_from_tshark_sync()
+        return self._packet_generator
+
     # Allows for child classes to call next() from super() without 2to3 "fixing"
     # the call
     def next_packet(self):
@@ -157,28 +342,52 @@ class FileCapture(object):
         return cur_packet
 
     def clear(self):
-        """Empties the capture of any saved packet."""
+        """Empties the capture of any saved packet. Packets are then read again from the start of the capture."""
         self._packets = []
         self._current_packet = 0
+        self.loaded = False
+        self._close_packet_generator()
+        self._close_packet_store()
 
     def reset(self):
         """
         Starts iterating packet from the first one.
+        If packets are not kept, the capture will be read again from its start.
         """
         self._current_packet = 0
+        if not self.keep_packets:
+            self._close_packet_generator()
+
+    def _close_packet_store(self):
+        if self._packet_store is not None:
+            self._packet_store.close()
+            self._packet_store = None
+
+    def _close_packet_generator(self):
+        if self._packet_generator is not None:
+            self._packet_generator.close()
+            self._packet_generator = None
 
     def load_packets(self, packet_count=0, timeout=None):
         """Reads the packets from the source (cap, interface, etc.) and adds it to the internal list.
         If 0 as the packet_count is given, reads forever
         :param packet_count: The amount of packets to add to the packet list (0 to read forever)
         :param timeout: If given, automatically stops after a given amount of time.
+
+        If the capture does not keep packets (and msgpack is installed), the packets are stored in a temporary file
+        rather than in memory, and __getitem__ reads them back from it.
         """
-        initial_packet_amount = len(self._packets)
+        packets = self._packets
+        if not self.keep_packets and packet_cache.msgpack is not None:
+            if self._packet_store is None:
+                self._packet_store = packet_cache.PacketStore(self._only_summaries)
+            packets = self._packet_store
+        initial_packet_amount = len(packets)
 
         def keep_packet(pkt):
-            self._packets.append(pkt)
+            packets.append(pkt)
 
-            if packet_count != 0 and len(self._packets) - initial_packet_amount >= packet_count:
+            if packet_count != 0 and len(packets) - initial_packet_amount >= packet_count:
                 raise StopCapture()
 
         try:
@@ -199,9 +408,16 @@ class FileCapture(object):
     def _setup_eventloop(self):
         """
         Sets up a new eventloop as the current one according to the OS.
+        If uvloop is installed it is used on POSIX, without replacing the asyncio eventloop (or policy) of the thread.
         """
         if os.name == "nt":
             self.eventloop = asyncio.ProactorEventLoop()
+        elif uvloop is not None:
+            # uvloop watches its own child processes, no child watcher is needed
+            self.eventloop = getattr(_uvloop_eventloops, "eventloop", None)
+            if self.eventloop is None or self.eventloop.is_closed():
+                self.eventloop = _uvloop_eventloops.eventloop = uvloop.new_event_loop()
+            return
         else:
             try:
                 self.eventloop = asyncio.get_event_loop()
@@ -215,32 +431,38 @@ class FileCapture(object):
         if os.name == "posix" and isinstance(threading.current_thread(), threading._MainThread):
             asyncio.get_child_watcher().attach_loop(self.eventloop)
 
-    def _get_json_separators(self):
-        """"Returns the separators between packet in a JSON output
+    @staticmethod
+    def _get_json_separators(tshark_version):
+        """"Returns the separators between packet in a JSON output of the given tshark version
 
         Returns a tuple of (packet_separator, end_of_file_separator, characters_to_disregard).
         The latter variable being the number of characters to ignore in order to pass the packet (i.e. extra newlines,
         commas, parenthesis).
         """
-        if self._get_tshark_version() >= LooseVersion("3.0.0"):
+        if tshark_version >= (3, 0, 0):
             return ("%s  },%s" % (os.linesep, os.linesep)).encode(), ("}%s]" % os.linesep).encode(), (
                     1 + len(os.linesep))
         else:
             return ("}%s%s  ," % (os.linesep, os.linesep)).encode(), ("}%s%s]" % (os.linesep, os.linesep)).encode(), 1
 
+    def _get_cache_options(self):
+        """Returns the options which change the packets read from the capture, to tell whether its cache fits them."""
+        return {"only_summaries": self._only_summaries, "use_json": self.use_json, "use_ek": self.use_ek,
+                "tshark_parameters": self.get_parameters()}
+
     def _extract_packet_json_from_data(self, data, got_first_packet=True):
-        tag_start = 0
+        tag_start = data.pos
         if not got_first_packet:
             tag_start = data.find(b"{")
             if tag_start == -1:
                 return None, data
-        packet_separator, end_separator, end_tag_strip_length = self._get_json_separators()
+        packet_separator, end_separator, end_tag_strip_length = self._json_separators
         found_separator = None
 
-        tag_end = data.find(packet_separator)
+        tag_end = data.find(packet_separator, tag_start)
         if tag_end == -1:
             # Not end of packet, maybe it has end of entire file?
-            tag_end = data.find(end_separator)
+            tag_end = data.find(end_separator, tag_start)
             if tag_end != -1:
                 found_separator = end_separator
         else:
@@ -249,62 +471,72 @@ class FileCapture(object):
 
         if found_separator:
             tag_end += len(found_separator) - end_tag_strip_length
-            return data[tag_start:tag_end], data[tag_end + 1:]
+            packet = data.take(tag_start, tag_end)
+            data.seek(tag_end + 1)
+            return packet, data
         return None, data
 
-    def _extract_tag_from_data(self, data, tag_name=b"packet"):
+    def _extract_packet_ek_from_data(self, data):
+        """Gets the next packet line of tshark elastic output, skipping the index lines between packets.
+
+        :return: a tuple of (packet, data). packet will be None if there is no complete packet line yet.
+        """
+        while True:
+            line_end = data.find(b"\n")
+            if line_end == -1:
+                return None, data
+            line = data.take(data.pos, line_end)
+            data.seek(line_end + 1)
+            if line.strip() and not line.startswith(b'{"index"'):
+                return line, data
+
+    def _extract_tag_from_data(self, data, opening_tag=b"<packet>", closing_tag=b"</packet>"):
         """Gets data containing a (part of) tshark xml.
 
-        If the given tag is found in it, returns the tag data and the remaining data.
-        Otherwise returns None and the same data.
+        If the given tag is found in it, returns the tag data and moves the buffer's cursor past it.
+        Otherwise returns None and leaves the buffer as is.
 
-        :param data: string of a partial tshark xml.
+        :param data: StreamBuffer of a partial tshark xml.
         :return: a tuple of (tag, data). tag will be None if none is found.
         """
-        opening_tag = b"<" + tag_name + b">"
-        closing_tag = opening_tag.replace(b"<", b"</")
-        tag_end = data.find(closing_tag)
-        if tag_end != -1:
-            tag_end += len(closing_tag)
-            tag_start = data.find(opening_tag)
-            return data[tag_start:tag_end], data[tag_end:]
+        tag_start, tag_end = data.find_tag(opening_tag, closing_tag)
+        if tag_start != -1:
+            return data.take(tag_start, tag_end), data
         return None, data
 
     def _packets_from_tshark_sync(self, packet_count=None, existing_process=None):
         """
         Returns a generator of packet.
-        This is the sync version of packets_from_tshark. It wait for the completion of each coroutine and
-         reimplements reading packet in a sync way, yielding each packet as it arrives.
+        This is the sync version of packets_from_tshark. It runs the eventloop until the packets in the data read so far
+        are parsed and then yields all of them, rather than running the eventloop once per packet.
 
         :param packet_count: If given, stops after this amount of packet is captured.
         """
-        # NOTE: This has code duplication with the async version, think about how to solve this
-        tshark_process = existing_process or self.eventloop.run_until_complete(self._get_tshark_process())
-        psml_structure, data = self.eventloop.run_until_complete(self._get_psml_struct(tshark_process.stdout))
+        if self._cache_path and not existing_process and \
+                packet_cache.is_cache_valid(self._cache_path, self.input_filename, self._get_cache_options()):
+            self._log.debug("Reading packets from cache %s" % self._cache_path)
+            for packet in itertools.islice(packet_cache.packets_from_cache(self._cache_path, self._only_summaries),
+                                           packet_count):
+                yield packet
+            return
 
-        # During summary gathering the first packet is lost as the packet data is lost before conversion. Hence new tshark process is created.
         tshark_process = existing_process or self.eventloop.run_until_complete(self._get_tshark_process())
-        packets_captured = 0
-
-        data = b""
+        reader = _PacketReader(self, tshark_process.stdout, packet_count=packet_count)
         try:
             while True:
-                try:
-                    packet, data = self.eventloop.run_until_complete(
-                        self._get_packet_from_stream(tshark_process.stdout, data, psml_structure=psml_structure,
-                                                     got_first_packet=packets_captured > 0))
-
-                except EOFError:
+                packets = self.eventloop.run_until_complete(reader.read_packets())
+                if not packets:
                     self._log.debug("EOF reached (sync)")
                     break
-
-                if packet:
-                    packets_captured += 1
+                for packet in packets:
                     yield packet
-                if packet_count and packets_captured >= packet_count:
-                    break
         finally:
-            if tshark_process in self._running_processes:
+            reader.close()
+            if self.eventloop.is_closed() or self.eventloop.is_running():
+                # Closed by the garbage collector, after the eventloop was closed or while it runs something else
+                self._kill_process_nowait(tshark_process)
+                self._running_processes.discard(tshark_process)
+            elif tshark_process in self._running_processes:
                 self.eventloop.run_until_complete(self._cleanup_subprocess(tshark_process))
 
     def apply_on_packets(self, callback, timeout=None, packet_count=None):
@@ -342,30 +574,51 @@ class FileCapture(object):
                 await self.close_async()
 
     async def _go_through_packets_from_fd(self, fd, packet_callback, packet_count=None):
-        """A coroutine which goes through a stream and calls a given callback for each XML packet seen in it."""
-        packets_captured = 0
-        self._log.debug("Starting to go through packet")
+        """A coroutine which goes through a stream and calls a given callback for each XML packet seen in it.
 
-        psml_struct, data = await self._get_psml_struct(fd)
-
-        while True:
-            try:
-                packet, data = await self._get_packet_from_stream(fd, data, got_first_packet=packets_captured > 0,
-                                                                  psml_structure=psml_struct)
-            except EOFError:
-                self._log.debug("EOF reached")
-                break
-
-            if packet:
-                packets_captured += 1
-                try:
-                    packet_callback(packet)
-                except StopCapture:
-                    self._log.debug("User-initiated capture stop in callback")
+        Packets are parsed in batches in the parse pool (if configured) while the stream keeps being read, the callback
+        is still called on them in order. If the capture has a cache path, a full read also writes the cache.
+        """
+        self._log.debug("Starting to go through packet")
+        reader = _PacketReader(self, fd, packet_count=packet_count)
+        try:
+            while True:
+                packets = await reader.read_packets()
+                if not packets:
                     break
+                for packet in packets:
+                    packet_callback(packet)
+        except StopCapture:
+            self._log.debug("User-initiated capture stop in callback")
+        finally:
+            reader.close()
 
-            if packet_count and packets_captured >= packet_count:
-                break
+    def _parse_packets_async(self, parse_packet, raw_packets):
+        """Returns a future of the list of packets parsed from a batch of raw tshark output.
+
+        The batch is parsed in the parse pool if one is configured, otherwise it is parsed right away.
+        """
+        loop = asyncio.get_event_loop()
+        if self._parse_processes:
+            if self._parse_pool is None:
+                self._parse_pool = concurrent.futures.ProcessPoolExecutor(self._parse_processes)
+            return loop.run_in_executor(self._parse_pool, _parse_packets, parse_packet, raw_packets)
+        future = loop.create_future()
+        future.set_result(_parse_packets(parse_packet, raw_packets))
+        return future
+
+    def _get_packet_parser(self, psml_structure=None):
+        """Returns a (picklable) function which creates a packet object from a raw packet of tshark output."""
+        # packet_from_xml_packet parses with plain lxml.etree (not objectify) and still accepts already parsed
+        # objectified elements, so callers passing those in keep working.
+        if self.use_ek:
+            return packet_from_ek_packet
+        if self.use_json:
+            return packet_from_json_packet
+        if self._parse_processes:
+            # The memo would be pickled along with every packet, and could not be shared by the workers anyway.
+            return functools.partial(packet_from_xml_packet, psml_structure=psml_structure)
+        return functools.partial(packet_from_xml_packet, psml_structure=psml_structure, key_memo=self._key_memo)
 
     async def _get_psml_struct(self, fd):
         """Gets the current PSML (packet summary xml) structure in a tuple ((None, leftover_data)),
@@ -373,15 +626,15 @@ class FileCapture(object):
 
         A coroutine.
         """
-        data = b""
+        data = StreamBuffer()
         psml_struct = None
 
         if self._only_summaries:
             # If summaries are read, we need the psdml structure which appears on top of the file.
             while not psml_struct:
                 new_data = await fd.read(self.SUMMARIES_BATCH_SIZE)
-                data += new_data
-                psml_struct, data = self._extract_tag_from_data(data, b"structure")
+                data.feed(new_data)
+                psml_struct, data = self._extract_tag_from_data(data, b"<structure>", b"</structure>")
                 if psml_struct:
                     psml_struct = psml_structure_from_xml(psml_struct)
                 elif not new_data:
@@ -390,43 +643,29 @@ class FileCapture(object):
         else:
             return None, data
 
-    async def _get_packet_from_stream(self, stream, existing_data, got_first_packet=True, psml_structure=None):
-        """A coroutine which returns a single packet if it can be read from the given StreamReader.
+    def _extract_raw_packet_from_data(self, data, got_first_packet=True):
+        """Gets the tshark output of the next packet in the data read so far, without parsing it.
 
-        :return a tuple of (packet, remaining_data). The packet will be None if there was not enough XML data to create
-        a packet. remaining_data is the leftover data which was not enough to create a packet from.
-        :raises EOFError if EOF was reached.
+        :param data: StreamBuffer holding the data read so far.
+        :return a tuple of (raw_packet, data). raw_packet will be None if there is no complete packet in the data yet,
+        otherwise the cursor of the buffer is moved past it.
         """
-        # yield each packet in existing_data
-        if self.use_json:
-            packet, existing_data = self._extract_packet_json_from_data(existing_data,
-                                                                        got_first_packet=got_first_packet)
+        if self.use_ek:
+            packet, data = self._extract_packet_ek_from_data(data)
+        elif self.use_json:
+            packet, data = self._extract_packet_json_from_data(data, got_first_packet=got_first_packet)
         else:
-            packet, existing_data = self._extract_tag_from_data(existing_data)
+            packet, data = self._extract_tag_from_data(data)
 
-        if packet:
-            if self.use_json:
-                packet = packet
-            else:
-                try:
-                    self._log.debug('Packet XML Data = \n{}\n'.format(packet.decode('UTF-8')))
-                except UnicodeDecodeError:
-                    packet = packet.decode('UTF-', 'ignore')
-                    packet = packet.encode()
-                    self._log.debug('Packet XML Data = \n{}\n'.format(packet.decode('UTF-8')))
-                packet = packet_from_xml_packet(packet, psml_structure=psml_structure)
-            return packet, existing_data
-
-        new_data = await stream.read(self.DEFAULT_BATCH_SIZE)
-        existing_data += new_data
-
-        if not new_data:
-            # Reached EOF
-            raise EOFError()
-        return None, existing_data
+        if packet and not self.use_json and self._log.isEnabledFor(logging.DEBUG):
+            # Only decoded for the log, the XML parser copes with invalid UTF-8 by itself.
+            self._log.debug('Packet XML Data = \n{}\n'.format(packet.decode('UTF-8', 'ignore')))
+        return packet, data
 
     def _get_tshark_path(self):
-        return get_process_path(self.tshark_path)
+        if self.__tshark_path is None:
+            self.__tshark_path = get_process_path(self.tshark_path)
+        return self.__tshark_path
 
     def _stderr_output(self):
         # Ignore stderr output unless in debug mode (sent to console)
@@ -442,7 +681,7 @@ class FileCapture(object):
         Returns a new tshark process with previously-set parameters.
         """
         if self.use_json:
-            output_type = "json"
+            output_type = "ek" if self.use_ek else "json"
             if not tshark_supports_json(self._get_tshark_version()):
                 raise TSharkVersionException("JSON only supported on Wireshark >= 2.2.0")
         else:
@@ -452,13 +691,54 @@ class FileCapture(object):
 
         self._log.debug("Creating TShark subprocess with parameters: " + " ".join(parameters))
         self._log.debug("Executable: %s" % parameters[0])
-        tshark_process = await asyncio.create_subprocess_exec(*parameters,
-                                                              stdout=subprocess.PIPE,
-                                                              stderr=self._stderr_output(),
-                                                              stdin=stdin)
+        stdout_fd, stdout = None, subprocess.PIPE
+        if fcntl is not None and sys.platform.startswith("linux"):
+            # The pipe is created here rather than by the eventloop so it can be enlarged with any eventloop
+            stdout_fd, stdout = os.pipe()
+            self._enlarge_pipe(stdout)
+        try:
+            tshark_process = await asyncio.create_subprocess_exec(*parameters,
+                                                                  stdout=stdout,
+                                                                  stderr=self._stderr_output(),
+                                                                  stdin=stdin,
+                                                                  limit=self.STREAM_LIMIT)
+        except BaseException:
+            if stdout_fd is not None:
+                os.close(stdout_fd)
+            raise
+        finally:
+            if stdout_fd is not None:
+                # The write end belongs to tshark now
+                os.close(stdout)
+        if stdout_fd is not None:
+            tshark_process.stdout = await self._get_pipe_reader(stdout_fd)
         self._created_new_process(parameters, tshark_process)
         return tshark_process
 
+    def _enlarge_pipe(self, fd):
+        """
+        Enlarges the given pipe (Linux only), so tshark is not blocked on its output while packets are parsed.
+        """
+        try:
+            fcntl.fcntl(fd, F_SETPIPE_SZ, self.PIPE_SIZE)
+        except OSError:
+            # Unprivileged users may not go above /proc/sys/fs/pipe-max-size
+            self._log.debug("Could not enlarge the pipe of the process")
+
+    async def _get_pipe_reader(self, fd):
+        """Returns a StreamReader reading from the given pipe file descriptor."""
+        loop = asyncio.get_event_loop()
+        reader = asyncio.StreamReader(limit=self.STREAM_LIMIT)
+        await loop.connect_read_pipe(lambda: asyncio.StreamReaderProtocol(reader), os.fdopen(fd, "rb", 0))
+        return reader
+
+    @staticmethod
+    def _close_stdout(process):
+        """Closes the stdout pipe of the process, which may have been created apart from the process itself."""
+        transport = getattr(process.stdout, "_transport", None)
+        if transport is not None:
+            transport.close()
+
     def _created_new_process(self, parameters, process, process_name="TShark"):
         self._log.debug(process_name + " subprocess created")
         if process.returncode is not None and process.returncode != 0:
@@ -471,6 +751,7 @@ class FileCapture(object):
         """
         Kill the given process and properly closes any pipes connected to it.
         """
+        self._close_stdout(process)
         if process.returncode is None:
             try:
                 process.kill()
@@ -488,21 +769,58 @@ class FileCapture(object):
                                        % process.returncode)
 
     def close(self):
+        self._close_packet_generator()
         self.eventloop.run_until_complete(self.close_async())
+        self._close_packet_store()
 
     async def close_async(self):
         for process in self._running_processes.copy():
             await self._cleanup_subprocess(process)
         self._running_processes.clear()
+        if self._parse_pool is not None:
+            self._parse_pool.shutdown(wait=False)
+            self._parse_pool = None
 
     def __del__(self):
-        if self._running_processes:
-            self.close()
+        # The eventloop may already be closed (or be running in another thread) by now, so processes are killed
+        # without it. Explicit close() calls still go through the eventloop.
+        for process in self._running_processes:
+            self._kill_process_nowait(process)
+        self._running_processes.clear()
+        if self._parse_pool is not None:
+            self._parse_pool.shutdown(wait=False)
+        self._close_packet_store()
+
+    @staticmethod
+    def _kill_process_nowait(process):
+        """
+        Kills the given process and reaps it if it already exited, without waiting for it.
+        """
+        try:
+            FileCapture._close_stdout(process)
+        except RuntimeError:
+            # The eventloop is closed, the pipe is closed along with its transport
+            pass
+        if process.returncode is not None:
+            return
+        try:
+            process.kill()
+        except OSError:
+            return
+        if os.name == "posix":
+            try:
+                os.waitpid(process.pid, os.WNOHANG)
+            except ChildProcessError:
+                # Already reaped by the child watcher
+                pass
 
     def __enter__(self): return self
     async def __aenter__(self): return self
     def __exit__(self, exc_type, exc_val, exc_tb): self.close()
-    async def __aexit__(self, exc_type, exc_val, exc_tb): await self.close_async()
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        await self.close_async()
+        self._close_packet_store()
 
     def get_parameters(self, packet_count=None):
         """
@@ -517,6 +835,13 @@ class FileCapture(object):
         # Raw is only enabled when JSON is also enabled.
         if self.include_raw:
             params += ["-x"]
+        if self.use_json:
+            if self._protocols:
+                # The frame layer is needed to create any packet
+                params += ["-J", " ".join(["frame"] + list(self._protocols))]
+                if not self.use_ek and self._get_tshark_version() >= (3, 0, 0):
+                    # Repeated fields are then given as lists, rather than keys which the JSON decoder would overwrite
+                    params += ["--no-duplicate-keys"]
         if packet_count:
             params += ["-c", str(packet_count)]
 
@@ -553,10 +878,36 @@ class FileCapture(object):
         return params
 
     def __iter__(self):
-        return self._packets_from_tshark_sync()
+        """
+        Iterates over the packets of the capture, using the same tshark process as next() rather than a new one.
+
+        If packets are kept, every iteration starts from the first packet: packets read before are taken from the
+        kept packets and the rest are read from tshark. Otherwise iteration continues from the last packet read,
+        call reset() to read the capture again from its start, unless the packets were loaded by load_packets: these
+        are read back from where they are stored, from the first one.
+        """
+        if not self.keep_packets and self._packet_store is not None:
+            for packet in self._packet_store:
+                yield packet
+            return
+        if not self.keep_packets:
+            while True:
+                try:
+                    yield self.next()
+                except StopIteration:
+                    return
+        packet_index = 0
+        while True:
+            while packet_index >= len(self._packets):
+                try:
+                    self.next()
+                except StopIteration:
+                    return
+            yield self._packets[packet_index]
+            packet_index += 1
 
     def __repr__(self):
         if self.keep_packets:
             return '<%s %s>' % (self.__class__.__name__, self.input_filename)
         else:
-            return '<%s %s (%d packet)>' % (self.__class__.__name__, self.input_filename, len(self._packets))
+            return '<%s %s (%d packet)>' % (self.__class__.__name__, self.input_filename, len(self))
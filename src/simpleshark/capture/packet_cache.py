@@ -0,0 +1,111 @@
+"""Stores parsed packets on disk as msgpack, as the cache of a capture file or instead of keeping them in memory."""
+import array
+import os
+import tempfile
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+from simpleshark.packet.packet import Packet
+from simpleshark.packet.packet_summary import PacketSummary
+
+
+class PacketCacheWriter(object):
+    """
+    Writes packets into a temporary file, which only becomes the cache once all the packets of the capture were
+    written to it.
+    """
+
+    def __init__(self, cache_path, options):
+        """
+        :param options: The options the packets were read with, written at the start of the cache.
+        """
+        self.cache_path = cache_path
+        self._packer = msgpack.Packer()
+        # A unique temporary file, so captures writing the same cache at once do not write into the same file
+        temp_fd, self._temp_path = tempfile.mkstemp(prefix=os.path.basename(cache_path) + ".", suffix=".tmp",
+                                                    dir=os.path.dirname(os.path.abspath(cache_path)))
+        self._file = os.fdopen(temp_fd, "wb")
+        self._file.write(self._packer.pack({"options": options}))
+
+    def write(self, packet):
+        self._file.write(self._packer.pack(packet.to_dict()))
+
+    def commit(self):
+        self._file.close()
+        os.replace(self._temp_path, self.cache_path)
+
+    def discard(self):
+        self._file.close()
+        try:
+            os.remove(self._temp_path)
+        except OSError:
+            pass
+
+
+class PacketStore(object):
+    """
+    Keeps packets in a temporary file rather than in memory, reading them back one at a time by index.
+    """
+
+    def __init__(self, only_summaries=False):
+        self._packet_class = PacketSummary if only_summaries else Packet
+        self._packer = msgpack.Packer()
+        self._file = tempfile.TemporaryFile()
+        self._offsets = array.array('q', [0])
+
+    def __len__(self):
+        return len(self._offsets) - 1
+
+    def __iter__(self):
+        for index in range(len(self)):
+            yield self[index]
+
+    def __getitem__(self, index):
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError('Packet of index %d is not in the store' % index)
+        self._file.seek(self._offsets[index])
+        packet_data = self._file.read(self._offsets[index + 1] - self._offsets[index])
+        return self._packet_class.from_dict(msgpack.unpackb(packet_data, raw=False))
+
+    def append(self, packet):
+        self._file.seek(self._offsets[-1])
+        self._file.write(self._packer.pack(packet.to_dict()))
+        self._offsets.append(self._file.tell())
+
+    def close(self):
+        self._file.close()
+
+
+def is_cache_valid(cache_path, input_filename, options):
+    """
+    Returns whether the cache exists, is newer than the capture file and was written with the given options.
+    """
+    if not os.path.exists(cache_path) or os.path.getmtime(cache_path) < os.path.getmtime(input_filename):
+        return False
+    with open(cache_path, "rb") as cache_file:
+        try:
+            header = next(msgpack.Unpacker(cache_file, raw=False))
+        except (StopIteration, ValueError, msgpack.UnpackException):
+            return False
+    # Packed and unpacked the same way as the header, e.g. tuples become lists
+    return header == {"options": msgpack.unpackb(msgpack.packb(options), raw=False)}
+
+
+def packets_from_cache(cache_path, only_summaries=False):
+    """
+    Returns a generator of the packets in the cache.
+
+    :param only_summaries: Whether the cache holds packet summaries rather than packets.
+    """
+    packet_class = PacketSummary if only_summaries else Packet
+    with open(cache_path, "rb") as cache_file:
+        unpacker = msgpack.Unpacker(cache_file, raw=False)
+        # Skips the options header
+        next(unpacker, None)
+        for packet_dict in unpacker:
+            yield packet_class.from_dict(packet_dict)
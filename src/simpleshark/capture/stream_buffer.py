@@ -0,0 +1,100 @@
+def _find_tag(buf, opening_tag, closing_tag, start=0):
+    """
+    Returns the (start, end) indices of the first complete tag at or after start. end is -1 if only the opening tag
+    was found, and start too if neither was.
+    """
+    tag_start = buf.find(opening_tag, start)
+    if tag_start != -1:
+        tag_end = buf.find(closing_tag, tag_start + len(opening_tag))
+        if tag_end != -1:
+            return tag_start, tag_end + len(closing_tag)
+    return tag_start, -1
+
+
+class StreamBuffer(object):
+    """
+    A buffer of tshark output with a read cursor.
+
+    Extracting a packet only moves the cursor forward instead of slicing off the remaining data, so the bytes read
+    from tshark are not copied again and again while packets are taken out of them.
+    """
+    COMPACT_THRESHOLD = 2 ** 20
+
+    def __init__(self, data=b""):
+        self._buf = bytearray(data)
+        self._pos = 0
+        # Where find_tag stopped scanning for the tags (and the opening tag it found), to resume from there later
+        self._scan_tags = None
+        self._scan_pos = 0
+        self._tag_start = -1
+
+    def __len__(self):
+        return max(len(self._buf) - self._pos, 0)
+
+    @property
+    def pos(self):
+        """Absolute index of the read cursor."""
+        return self._pos
+
+    def feed(self, data):
+        """Appends newly read data, dropping the already consumed data once enough of it piled up."""
+        if self._pos > self.COMPACT_THRESHOLD:
+            consumed = min(self._pos, len(self._buf))
+            del self._buf[:consumed]
+            self._pos -= consumed
+            self._scan_pos -= consumed
+            if self._tag_start != -1:
+                self._tag_start -= consumed
+        self._buf += data
+
+    def find(self, sub, start=None):
+        """
+        Returns the absolute index of sub, searching from start (the read cursor by default), or -1 if not found.
+        """
+        return self._buf.find(sub, self._pos if start is None else start)
+
+    def find_tag(self, opening_tag, closing_tag):
+        """
+        Returns the absolute (start, end) indices of the first complete tag after the read cursor, or (-1, -1).
+
+        The buffer is scanned forward only: if the tag is not complete yet, the next call continues from where this
+        one stopped instead of scanning the partial tag again.
+        """
+        if self._scan_tags != (opening_tag, closing_tag) or self._scan_pos < self._pos:
+            self._scan_tags = (opening_tag, closing_tag)
+            self._scan_pos = self._pos
+            self._tag_start = -1
+
+        if self._tag_start == -1:
+            tag_start, tag_end = _find_tag(self._buf, opening_tag, closing_tag, self._scan_pos)
+        else:
+            tag_start, tag_end = self._tag_start, self._buf.find(closing_tag, self._scan_pos)
+            if tag_end != -1:
+                tag_end += len(closing_tag)
+
+        if tag_end != -1:
+            self._scan_pos = tag_end
+            self._tag_start = -1
+            return tag_start, tag_end
+
+        # A tag may be cut in the middle of the data, so only its possible beginning is scanned again
+        self._tag_start = tag_start
+        if tag_start == -1:
+            self._scan_pos = max(self._scan_pos, len(self._buf) - len(opening_tag) + 1)
+        else:
+            self._scan_pos = max(tag_start + len(opening_tag), len(self._buf) - len(closing_tag) + 1)
+        return -1, -1
+
+    def take(self, start, end):
+        """
+        Returns the data between the absolute indices start and end and moves the cursor to end.
+        """
+        # A bytes copy is returned rather than a view, as a live view would prevent the buffer from growing.
+        with memoryview(self._buf) as view:
+            data = bytes(view[start:end])
+        self._pos = end
+        return data
+
+    def seek(self, pos):
+        """Moves the read cursor to the given absolute index."""
+        self._pos = pos
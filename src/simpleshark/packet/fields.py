@@ -1,26 +1,61 @@
 import datetime
+import sys
 
+from simpleshark.packet.common import Pickleable
 
-class Field(object):
 
-    def __init__(self, xml, field_type='Field'):
+def _memoize(key_memo, string):
+    """
+    Returns the single (interned) instance kept in key_memo for strings equal to the given one.
+    """
+    memoized = key_memo.get(string)
+    if memoized is None:
+        memoized = key_memo[string] = sys.intern(string)
+    return memoized
+
+
+class Field(Pickleable):
+
+    def __init__(self, xml=None, field_type='Field', key_memo=None):
+        """
+        :param xml: The xml element of the field, if any.
+        :param key_memo: An optional dict used to share the attribute names and field names between all the
+        fields created with it (they repeat in every packet of a capture), instead of keeping a copy per field.
+        """
         self.TYPE = field_type
         self.properties = dict()
         self.fields = []
-        self._update_field_info(xml)
-
-    def _update_field_info(self, xml):
+        if xml is not None:
+            self._update_field_info(xml, key_memo)
+
+    def to_dict(self):
+        """Returns the field and its sub-fields as plain dicts and lists, e.g. to serialize it."""
+        return {'type': self.TYPE, 'properties': self.properties, 'fields': [field.to_dict() for field in self.fields]}
+
+    @classmethod
+    def from_dict(cls, field_dict):
+        """Creates a field from the output of to_dict."""
+        field = cls(field_type=field_dict['type'])
+        field.properties = field_dict['properties']
+        field.fields = [cls.from_dict(sub_field) for sub_field in field_dict['fields']]
+        return field
+
+    def _update_field_info(self, xml, key_memo=None):
         for k, v in xml.attrib.items():
+            if key_memo is not None:
+                k = _memoize(key_memo, k)
+                if k == 'name':
+                    v = _memoize(key_memo, v)
             self.properties[k] = v
-        self.add_fields(xml)
+        self.add_fields(xml, key_memo)
 
-    def add_fields(self, xml):
+    def add_fields(self, xml, key_memo=None):
         for x in xml.findall('field'):
-            field = Field(x)
+            field = Field(x, key_memo=key_memo)
             self.fields.append(field)
 
         for x in xml.findall('proto'):
-            field = Field(x, 'Proto')
+            field = Field(x, 'Proto', key_memo)
             self.fields.append(field)
 
     def get_fields(self):
@@ -1,8 +1,10 @@
 from simpleshark.packet import consts
+from simpleshark.packet.common import Pickleable
+from simpleshark.packet.fields import Field
 import datetime
 
 
-class Packet(object):
+class Packet(Pickleable):
     """
     A packet object which contains layers.
     Layers can be accessed via index or name.
@@ -30,6 +32,17 @@ class Packet(object):
         self.length = geninfo.get_field_value('len')
         self.timestamp = geninfo.timestamp
 
+    def to_dict(self):
+        """Returns the packet as plain dicts and lists, e.g. to serialize it."""
+        return {'protos': [proto.to_dict() for proto in self.protos], 'geninfo': self.geninfo.to_dict(),
+                'frame': self.frame.to_dict()}
+
+    @classmethod
+    def from_dict(cls, packet_dict):
+        """Creates a packet from the output of to_dict."""
+        return cls([Field.from_dict(proto) for proto in packet_dict['protos']], Field.from_dict(packet_dict['geninfo']),
+                   Field.from_dict(packet_dict['frame']))
+
     def __repr__(self):
         transport_protocol = ''
         if self.transport_layer != self.highest_layer and self.transport_layer is not None:
@@ -14,6 +14,15 @@ class PacketSummary(object):
             self._field_order.append(key)
             setattr(self, key.lower().replace('.', '').replace(',', ''), val)
 
+    def to_dict(self):
+        """Returns the summary as plain dicts and lists, e.g. to serialize it."""
+        return {'structure': self._field_order, 'values': [self._fields[key] for key in self._field_order]}
+
+    @classmethod
+    def from_dict(cls, summary_dict):
+        """Creates a summary from the output of to_dict."""
+        return cls(summary_dict['structure'], summary_dict['values'])
+
     def __repr__(self):
         protocol, src, dst = self._fields.get('Protocol', '?'), self._fields.get('Source', '?'),\
                              self._fields.get('Destination', '?')
@@ -1,5 +1,5 @@
 """Module used for the actual running of TShark"""
-from distutils.version import LooseVersion
+import functools
 import os
 import subprocess
 import sys
@@ -60,7 +60,12 @@ def get_process_path(tshark_path=None, process_name="tshark"):
     )
 
 
+@functools.lru_cache(maxsize=8)
 def get_tshark_version(tshark_path=None):
+    """
+    Returns the version of tshark as a tuple of ints, i.e. (3, 6, 2). Cached per tshark_path, as finding it out means
+    running tshark.
+    """
     parameters = [get_process_path(tshark_path), '-v']
     with open(os.devnull, 'w') as null:
         version_output = subprocess.check_output(parameters, stderr=null).decode("ascii")
@@ -72,18 +77,18 @@ def get_tshark_version(tshark_path=None):
         raise TSharkVersionException('Unable to parse TShark version from: {}'.format(version_line))
     version_string = m.groups()[0]  # Use first match found
 
-    return LooseVersion(version_string)
+    return tuple(int(part) for part in version_string.split('.'))
 
 
 def tshark_supports_json(tshark_version):
-    return tshark_version >= LooseVersion("2.2.0")
+    return tshark_version >= (2, 2, 0)
 
 
 def get_tshark_display_filter_flag(tshark_version):
     """
     Returns '-Y' for tshark versions >= 1.10.0 and '-R' for older versions.
     """
-    if tshark_version >= LooseVersion("1.10.0"):
+    if tshark_version >= (1, 10, 0):
         return '-Y'
     else:
         return '-R'
@@ -0,0 +1,137 @@
+"""This module contains functions to turn TShark JSON parts into Packet objects."""
+try:
+    import orjson as json
+except ImportError:
+    import json
+
+from simpleshark.packet.fields import Field
+from simpleshark.packet.packet import Packet
+
+RAW_SUFFIX = '_raw'
+TREE_SUFFIX = '_tree'
+
+# Fields of the frame layer which PDML reports in its "geninfo" pseudo-protocol.
+GENINFO_FIELDS = [('num', 'number'), ('len', 'len'), ('caplen', 'cap_len')]
+
+
+def packet_from_json_packet(json_pkt):
+    """
+    Gets a TShark JSON packet object or string, and returns a Packet object.
+
+    :param json_pkt: bytes or an already decoded dict.
+    :return: Packet object.
+    """
+    if not isinstance(json_pkt, dict):
+        json_pkt = json.loads(json_pkt)
+    layers = json_pkt['_source']['layers']
+    protos = _fields_from_json(layers, 'Proto')
+    return Packet(protos[1:], _geninfo_from_json(layers['frame'], 'frame.'), protos[0])
+
+
+def packet_from_ek_packet(ek_pkt):
+    """
+    Gets a line of TShark elastic (-T ek) output, and returns a Packet object.
+
+    The elastic output flattens the fields of every layer and prefixes them as <layer>_<layer>_<field>, the prefix is
+    removed so that i.e. ip_ip_src is named src like in the other outputs.
+
+    :param ek_pkt: bytes or an already decoded dict.
+    :return: Packet object.
+    """
+    if not isinstance(ek_pkt, dict):
+        ek_pkt = json.loads(ek_pkt)
+    layers = dict((name, _strip_ek_prefix(name, value)) for name, value in ek_pkt['layers'].items())
+    protos = _fields_from_json(layers, 'Proto')
+    return Packet(protos[1:], _geninfo_from_json(layers['frame']), protos[0])
+
+
+def _strip_ek_prefix(layer_name, ek_fields):
+    if not isinstance(ek_fields, dict):
+        return ek_fields
+    prefix = '%s_%s_' % (layer_name, layer_name)
+    return dict((name[len(prefix):] if name.startswith(prefix) else name, value) for name, value in ek_fields.items())
+
+
+def _geninfo_from_json(frame, prefix=''):
+    """
+    Builds the PDML-like geninfo protocol out of the fields of the frame layer.
+
+    :param prefix: The prefix of the names of the frame fields.
+    """
+    geninfo = Field(field_type='Proto')
+    geninfo.properties['name'] = 'geninfo'
+    for name, frame_name in GENINFO_FIELDS:
+        geninfo.fields.append(_field_from_json(name, frame.get(prefix + frame_name, '')))
+    timestamp = _field_from_json('timestamp', frame.get(prefix + 'time', ''))
+    timestamp.properties['value'] = frame.get(prefix + 'time_epoch', '')
+    geninfo.fields.append(timestamp)
+    return geninfo
+
+
+def _field_from_json(name, value, field_type='Field'):
+    field = Field(field_type=field_type)
+    field.properties['name'] = name
+    if isinstance(value, dict):
+        field.properties['show'] = ''
+        field.fields = _fields_from_json(value)
+    else:
+        field.properties['show'] = value
+    return field
+
+
+def _fields_from_json(json_fields, field_type='Field'):
+    """
+    Converts a JSON object of fields into a list of Field objects.
+
+    "<name>_raw" entries (given by tshark -x) become the raw value of the field they belong to, and "<name>_tree"
+    entries become its sub-fields, just like the nesting in PDML. Repeated fields (given as lists when tshark is ran
+    with --no-duplicate-keys) get the items of their "_raw" and "_tree" lists in order.
+    """
+    fields = []
+    named_fields = {}
+    extras = []
+    for name, value in json_fields.items():
+        if name.endswith(RAW_SUFFIX) or name.endswith(TREE_SUFFIX):
+            extras.append((name, value))
+            continue
+        named_fields[name] = []
+        for single_value in (value if isinstance(value, list) else [value]):
+            field = _field_from_json(name, single_value, field_type)
+            fields.append(field)
+            named_fields[name].append(field)
+
+    for name, value in extras:
+        if name.endswith(RAW_SUFFIX):
+            owners = named_fields.get(name[:-len(RAW_SUFFIX)], [])
+            # Raw values are given as [hex_value, position, length, bitmask, type], or only as hex_value by -T ek
+            values = _split_repeated(value, len(owners), (list, str))
+            if values is not None:
+                for field, raw_value in zip(owners, values):
+                    while isinstance(raw_value, list) and raw_value:
+                        raw_value = raw_value[0]
+                    field.properties['value'] = raw_value
+                continue
+        else:
+            owners = named_fields.get(name[:-len(TREE_SUFFIX)], [])
+            values = _split_repeated(value, len(owners), dict)
+            if values is not None and all(isinstance(tree, dict) for tree in values):
+                for field, tree in zip(owners, values):
+                    field.fields.extend(_fields_from_json(tree))
+                continue
+        fields.append(_field_from_json(name, value, field_type))
+    return fields
+
+
+def _split_repeated(value, field_count, item_type):
+    """
+    Returns the values of a "_raw" or "_tree" entry for each of the field_count fields it belongs to, or None if they
+    do not match.
+
+    :param item_type: The type of the value of a single field, a list of such values is given for repeated fields.
+    """
+    if field_count == 1:
+        return [value]
+    if field_count > 1 and isinstance(value, list) and len(value) == field_count and \
+            all(isinstance(item, item_type) for item in value):
+        return value
+    return None
@@ -1,4 +1,5 @@
 """This module contains functions to turn TShark XML parts into Packet objects."""
+import lxml.etree
 import lxml.objectify
 
 from simpleshark.packet.fields import Field
@@ -6,39 +7,46 @@ from simpleshark.packet.packet import Packet
 from simpleshark.packet.packet_summary import PacketSummary
 import re
 
+# libxml2 parser used for packets. Packets are plain tshark output, so entities and network access are not needed.
+PACKET_PARSER = lxml.etree.XMLParser(huge_tree=True, recover=True, resolve_entities=False, no_network=True)
+
 
 def psml_structure_from_xml(psml_structure):
+    """
+    Returns the names of the fields in each packet summary, as a (picklable) list of strings.
+    """
     if not isinstance(psml_structure, lxml.objectify.ObjectifiedElement):
         psml_structure = lxml.objectify.fromstring(psml_structure)
-    return psml_structure.findall('section')
+    return [str(section) for section in psml_structure.findall('section')]
 
 
-def packet_from_xml_packet(xml_pkt, psml_structure=None):
+def packet_from_xml_packet(xml_pkt, psml_structure=None, key_memo=None):
     """
     Gets a TShark XML packet object or string, and returns a Packet object.
 
     :param xml_pkt: str or xml object.
     :param psml_structure: a list of the fields in each packet summary in the psml data. If given, packet will
     be returned as a PacketSummary object.
+    :param key_memo: optional dict shared between the packets of a capture, used to keep a single copy of the
+    attribute and field names repeating in all of them.
     :return: Packet object.
     """
-    if not isinstance(xml_pkt, lxml.objectify.ObjectifiedElement):
-        parser = lxml.objectify.makeparser(huge_tree=True, recover=True)
+    if not isinstance(xml_pkt, lxml.etree._Element):
         try:
-            xml_pkt = lxml.objectify.fromstring(xml_pkt, parser)
+            xml_pkt = lxml.etree.fromstring(xml_pkt, PACKET_PARSER)
         except lxml.etree.XMLSyntaxError:
             res = re.findall(r'<field name="num" pos="0" show="(.*?)"', xml_pkt.decode(), re.S)[0]
             print(f'Packet conversion error from xml to python object for packet number {res}.')
             return
     if psml_structure:
         return _packet_from_psml_packet(xml_pkt, psml_structure)
-    return _packet_object_from_xml(xml_pkt)
+    return _packet_object_from_xml(xml_pkt, key_memo)
 
 
 def _packet_from_psml_packet(psml_packet, structure):
-    return PacketSummary(structure, psml_packet.findall('section'))
+    return PacketSummary(structure, [section.text or '' for section in psml_packet.findall('section')])
 
 
-def _packet_object_from_xml(xml_pkt):
-    protos = [Field(x, 'Proto') for x in xml_pkt.proto]
+def _packet_object_from_xml(xml_pkt, key_memo=None):
+    protos = [Field(x, 'Proto', key_memo) for x in xml_pkt.findall('proto')]
     return Packet(protos[2:], protos[0], protos[1])
@@ -0,0 +1,28 @@
+import os
+import stat
+import sys
+
+import pytest
+
+FAKE_TSHARK_PATH = os.path.join(os.path.dirname(__file__), "fake_tshark.py")
+
+
+@pytest.fixture
+def capture_file(tmp_path):
+    """An empty capture file, the fake tshark does not read it."""
+    path = tmp_path / "capture.pcap"
+    path.write_bytes(b"")
+    return str(path)
+
+
+@pytest.fixture
+def fake_tshark(tmp_path):
+    """Returns a function creating a fake tshark which outputs the given amount of packets (None for endless)."""
+    def create_fake_tshark(packet_count=None):
+        path = tmp_path / ("tshark_%s" % packet_count)
+        with open(FAKE_TSHARK_PATH) as fake_tshark_file:
+            fake_tshark = fake_tshark_file.read().replace("PACKET_COUNT = None", "PACKET_COUNT = %r" % packet_count, 1)
+        path.write_text("#!%s\n%s" % (sys.executable, fake_tshark))
+        os.chmod(str(path), os.stat(str(path)).st_mode | stat.S_IEXEC)
+        return str(path)
+    return create_fake_tshark
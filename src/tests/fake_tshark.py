@@ -0,0 +1,64 @@
+"""Writes PACKET_COUNT packets in the output format given with -T, like tshark 3.6 does."""
+import itertools
+import json
+import sys
+
+# Set by conftest.py for each fake tshark, None for endless output
+PACKET_COUNT = None
+
+args = sys.argv[1:]
+if args == ["-v"]:
+    print("TShark (Wireshark) 3.6.2")
+    sys.exit(0)
+output_type = args[args.index("-T") + 1]
+numbers = itertools.islice(itertools.count(1), PACKET_COUNT)
+
+
+def write_pdml_packet(number):
+    sys.stdout.write('<packet>\n'
+                     '  <proto name="geninfo" pos="0" showname="General information" size="60">\n'
+                     '    <field name="num" pos="0" show="%d" showname="Number" value="1" size="60"/>\n'
+                     '    <field name="len" pos="0" show="60" showname="Frame Length" value="3c" size="60"/>\n'
+                     '    <field name="caplen" pos="0" show="60" showname="Captured Length" value="3c" size="60"/>\n'
+                     '    <field name="timestamp" pos="0" show="Jan  1, 2020" showname="Captured Time" '
+                     'value="1577836800.5" size="60"/>\n'
+                     '  </proto>\n'
+                     '  <proto name="frame" showname="Frame" size="60" pos="0">\n'
+                     '  </proto>\n'
+                     '  <proto name="ip" showname="IPv4" size="20" pos="14">\n'
+                     '    <field name="ip.src" showname="Source" size="4" pos="26" show="10.0.0.1" value="0a000001"/>\n'
+                     '  </proto>\n'
+                     '</packet>\n' % number)
+
+
+def json_layers(number):
+    return {
+        "frame": {"frame.interface_id": "0", "frame.time": "Jan  1, 2020 00:00:00.500000000 UTC",
+                  "frame.time_epoch": "1577836800.500000000", "frame.number": str(number), "frame.len": "60",
+                  "frame.cap_len": "60", "frame.protocols": "eth:ethertype:ip"},
+        "ip": {"ip.src": "10.0.0.1", "ip.flags": "0x02", "ip.flags_tree": {"ip.flags.df": "1"}},
+    }
+
+
+if output_type == "pdml":
+    sys.stdout.write('<?xml version="1.0" encoding="utf-8"?>\n<pdml version="0" creator="wireshark/3.6.2">\n')
+    for number in numbers:
+        write_pdml_packet(number)
+    sys.stdout.write('</pdml>\n')
+elif output_type == "json":
+    # Written like tshark: an indented array, one packet at a time
+    sys.stdout.write("[\n")
+    for number in numbers:
+        if number > 1:
+            sys.stdout.write(",\n")
+        packet = {"_index": "packets-2020-01-01", "_type": "doc", "_score": None,
+                  "_source": {"layers": json_layers(number)}}
+        sys.stdout.write("\n".join("  " + line for line in json.dumps(packet, indent=2).splitlines()))
+    sys.stdout.write("\n]\n")
+elif output_type == "ek":
+    for number in numbers:
+        sys.stdout.write('{"index":{"_index":"packets-2020-01-01","_type":"doc"}}\n')
+        layers = {"frame": {"frame_frame_interface_id": "0", "frame_frame_time_epoch": "1577836800.500000000",
+                            "frame_frame_number": str(number), "frame_frame_len": "60", "frame_frame_cap_len": "60"},
+                  "ip": {"ip_ip_src": "10.0.0.1", "ip_ip_flags_df": True}}
+        sys.stdout.write(json.dumps({"timestamp": "1577836800500", "layers": layers}, separators=(",", ":")) + "\n")
@@ -0,0 +1,109 @@
+import gc
+import os
+import time
+import weakref
+
+import pytest
+
+from simpleshark import FileCapture
+
+
+def _process_exited(pid, timeout=5):
+    end_time = time.monotonic() + timeout
+    while time.monotonic() < end_time:
+        try:
+            if os.waitpid(pid, os.WNOHANG)[0] == pid:
+                return True
+        except ChildProcessError:
+            # Reaped by the eventloop
+            return True
+        time.sleep(0.05)
+    return False
+
+
+@pytest.mark.skipif(os.name != "posix", reason="Checks the process with waitpid")
+def test_dropped_capture_is_collected_and_kills_tshark(fake_tshark, capture_file):
+    capture = FileCapture(capture_file, tshark_path=fake_tshark())
+    assert capture[2].number == "3"
+    tshark_pid = next(iter(capture._running_processes)).pid
+    capture_ref = weakref.ref(capture)
+
+    del capture
+    gc.collect()
+
+    assert capture_ref() is None
+    assert _process_exited(tshark_pid)
+
+
+def test_iteration_raises_errors_of_packet_parsing(fake_tshark, capture_file, monkeypatch):
+    def parse_packet(raw_packet):
+        raise KeyError("structure")
+
+    capture = FileCapture(capture_file, tshark_path=fake_tshark(5))
+    monkeypatch.setattr(capture, "_get_packet_parser", lambda psml_structure=None: parse_packet)
+    with pytest.raises(KeyError):
+        list(capture)
+    capture.close()
+
+
+def test_clear_reads_packets_again(fake_tshark, capture_file):
+    capture = FileCapture(capture_file, tshark_path=fake_tshark(5))
+    capture.load_packets()
+    capture.clear()
+    assert [packet.number for packet in capture] == ["1", "2", "3", "4", "5"]
+    assert len(capture) == 5
+    capture.close()
+
+
+def test_cache_is_only_used_with_the_same_options(fake_tshark, capture_file, tmp_path):
+    pytest.importorskip("msgpack")
+    cache_path = str(tmp_path / "capture.cache")
+    with FileCapture(capture_file, tshark_path=fake_tshark(5), cache_path=cache_path) as capture:
+        assert len(list(capture)) == 5
+
+    with FileCapture(capture_file, tshark_path=fake_tshark(3), cache_path=cache_path) as capture:
+        assert len(list(capture)) == 5
+    with FileCapture(capture_file, tshark_path=fake_tshark(3), cache_path=cache_path, display_filter="ip") as capture:
+        assert len(list(capture)) == 3
+    assert os.listdir(str(tmp_path)).count("capture.cache") == 1
+    assert not [name for name in os.listdir(str(tmp_path)) if name.endswith(".tmp")]
+
+
+def test_loaded_packets_are_iterated_from_the_store(fake_tshark, capture_file, monkeypatch):
+    pytest.importorskip("msgpack")
+    capture = FileCapture(capture_file, tshark_path=fake_tshark(5), keep_packets=False)
+    capture.load_packets()
+    monkeypatch.setattr(capture, "_get_tshark_process", None)
+    assert [packet.number for packet in capture] == ["1", "2", "3", "4", "5"]
+    assert capture[4].number == "5"
+    assert [capture.next().number, capture.next().number] == ["1", "2"]
+    capture.reset()
+    assert capture.next().number == "1"
+    assert repr(capture).endswith("(5 packet)>")
+
+    packet_store = capture._packet_store
+    capture.close()
+    assert capture._packet_store is None
+    assert packet_store._file.closed
+
+
+def test_no_duplicate_keys_only_with_protocols(fake_tshark, capture_file):
+    capture = FileCapture(capture_file, tshark_path=fake_tshark(), use_json=True)
+    assert "--no-duplicate-keys" not in capture.get_parameters()
+    capture = FileCapture(capture_file, tshark_path=fake_tshark(), use_json=True, protocols=["tcp"])
+    assert "--no-duplicate-keys" in capture.get_parameters()
+
+
+def test_json_capture(fake_tshark, capture_file):
+    with FileCapture(capture_file, tshark_path=fake_tshark(3), use_json=True) as capture:
+        packets = list(capture)
+    assert [packet.number for packet in packets] == ["1", "2", "3"]
+    assert packets[2].ip.src.value == "10.0.0.1"
+    assert packets[2].ip.flags.df.value == "1"
+
+
+def test_ek_capture(fake_tshark, capture_file):
+    with FileCapture(capture_file, tshark_path=fake_tshark(3), use_ek=True) as capture:
+        packets = list(capture)
+    assert [packet.number for packet in packets] == ["1", "2", "3"]
+    assert packets[2].ip.src.value == "10.0.0.1"
@@ -0,0 +1,46 @@
+import random
+
+from simpleshark.capture.stream_buffer import StreamBuffer
+
+
+def _take_tags(stream, split_sizes, opening_tag=b"<packet>", closing_tag=b"</packet>"):
+    """Feeds the stream to a StreamBuffer in parts of the given sizes, and takes every complete tag from it."""
+    buffer = StreamBuffer()
+    tags = []
+    position = 0
+    for split_size in split_sizes:
+        buffer.feed(stream[position:position + split_size])
+        position += split_size
+        while True:
+            tag_start, tag_end = buffer.find_tag(opening_tag, closing_tag)
+            if tag_start == -1:
+                break
+            tags.append(buffer.take(tag_start, tag_end))
+    return tags
+
+
+def test_find_tag_across_split_reads(monkeypatch):
+    # Compacts the buffer all the time, to check the scan positions are moved along with the data
+    monkeypatch.setattr(StreamBuffer, "COMPACT_THRESHOLD", 50)
+    rng = random.Random(1)
+    for _ in range(2000):
+        # Bodies full of partial tags: "<", "/" and ">" without the rest of the tag
+        packets = [b"<packet>" + bytes(rng.choices(b"xy/>", k=rng.randint(0, 40))) + b"</packet>"
+                   for _ in range(rng.randint(0, 20))]
+        stream = b"<pdml>\n" + b"\n".join(packets) + b"\n</pdml>"
+        split_sizes = [rng.randint(1, 15) for _ in range(len(stream))]
+        assert _take_tags(stream, split_sizes) == packets
+
+
+def test_find_tag_with_tags_cut_at_every_position():
+    stream = b"<psml>\n<structure>\n<section>No.</section>\n</structure>\n<packet>1</packet>\n"
+    for split_at in range(len(stream) + 1):
+        assert _take_tags(stream, [split_at, len(stream)], b"<structure>", b"</structure>") == \
+            [b"<structure>\n<section>No.</section>\n</structure>"]
+
+
+def test_find_tag_without_complete_tag():
+    buffer = StreamBuffer(b"<packet>abc</pack")
+    assert buffer.find_tag(b"<packet>", b"</packet>") == (-1, -1)
+    buffer.feed(b"et>")
+    assert buffer.find_tag(b"<packet>", b"</packet>") == (0, 20)
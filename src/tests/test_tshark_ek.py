@@ -0,0 +1,39 @@
+from simpleshark.tshark.tshark_json import packet_from_ek_packet
+
+EK_PACKET = (b'{"timestamp":"1577836800500","layers":{'
+             b'"frame":{"frame_frame_interface_id":"0","frame_frame_time":"Jan  1, 2020 00:00:00.500000000 UTC",'
+             b'"frame_frame_time_epoch":"1577836800.500000000","frame_frame_number":"7","frame_frame_len":"66",'
+             b'"frame_frame_cap_len":"64","frame_frame_protocols":"eth:ethertype:ip:udp"},'
+             b'"eth":{"eth_eth_dst":"ff:ff:ff:ff:ff:ff","eth_eth_dst_raw":"ffffffffffff","eth_eth_dst_resolved":'
+             b'"Broadcast"},'
+             b'"ip":{"ip_ip_src":"10.0.0.1","ip_ip_src_raw":"0a000001","ip_ip_flags_df":true,'
+             b'"ip_ip_addr":["10.0.0.1","10.0.0.2"],"ip_ip_addr_raw":["0a000001","0a000002"]},'
+             b'"udp":{"udp_udp_srcport":53}}}')
+
+
+def test_geninfo_and_frame_from_the_frame_layer():
+    packet = packet_from_ek_packet(EK_PACKET)
+
+    assert packet.number == "7"
+    assert packet.length == "66"
+    assert packet.captured_length == "64"
+    assert packet.timestamp.raw == "1577836800.500000000"
+    assert packet.interface_captured == "0"
+    assert [proto.name for proto in packet.protos] == ["eth", "ip", "udp"]
+
+
+def test_layer_prefix_is_stripped():
+    packet = packet_from_ek_packet(EK_PACKET)
+
+    assert [field.properties['name'] for field in packet.eth.fields] == ["dst", "dst_resolved"]
+    assert packet.ip.flags_df.value is True
+    assert packet.udp.srcport.value == 53
+
+
+def test_raw_values():
+    packet = packet_from_ek_packet(EK_PACKET)
+
+    assert packet.eth.dst.raw == "ffffffffffff"
+    assert packet.ip.src.raw == "0a000001"
+    assert [field.raw for field in packet.ip.get_multiple_fields("addr")] == ["0a000001", "0a000002"]
+    assert [field.value for field in packet.ip.get_multiple_fields("addr")] == ["10.0.0.1", "10.0.0.2"]
@@ -0,0 +1,104 @@
+from simpleshark.tshark.tshark_json import packet_from_json_packet
+
+
+def _json_packet(layers):
+    """A packet of tshark -T json output with the given layers (and a frame layer)."""
+    frame = {
+        "frame.interface_id": "0",
+        "frame.time": "Jan  1, 2020 00:00:00.500000000 UTC",
+        "frame.time_epoch": "1577836800.500000000",
+        "frame.number": "7",
+        "frame.len": "66",
+        "frame.cap_len": "64",
+        "frame.protocols": "eth:ethertype:ip:tcp",
+    }
+    return {"_index": "packets-2020-01-01", "_type": "doc", "_score": None,
+            "_source": {"layers": dict([("frame", frame)] + list(layers.items()))}}
+
+
+def _fields_named(field, name):
+    return [sub_field for sub_field in field.fields if sub_field.properties['name'] == name]
+
+
+def test_geninfo_and_frame_from_the_frame_layer():
+    packet = packet_from_json_packet(_json_packet({"ip": {"ip.src": "10.0.0.1"}}))
+
+    assert packet.number == "7"
+    assert packet.length == "66"
+    assert packet.captured_length == "64"
+    assert packet.timestamp.value == "Jan  1, 2020 00:00:00.500000000 UTC"
+    assert packet.timestamp.raw == "1577836800.500000000"
+    assert packet.interface_captured == "0"
+    assert packet.frame.name == "frame"
+    assert [proto.name for proto in packet.protos] == ["ip"]
+    assert packet.ip.src.value == "10.0.0.1"
+
+
+def test_json_packet_as_bytes():
+    packet = packet_from_json_packet(b'{"_source": {"layers": {"frame": {"frame.number": "3", "frame.len": "60", '
+                                     b'"frame.cap_len": "60", "frame.time_epoch": "1.5"}, "udp": {}}}}')
+    assert packet.number == "3"
+    assert packet.highest_layer == "UDP"
+
+
+def test_raw_values_and_trees():
+    # From tshark -T json -x, the raw values of layers come next to them in the layers object
+    layers = {
+        "eth_raw": ["ffffffffffff0800", 0, 14, 0, 1],
+        "eth": {
+            "eth.dst": "ff:ff:ff:ff:ff:ff",
+            "eth.dst_raw": ["ffffffffffff", 0, 6, 0, 29],
+            "eth.dst_tree": {
+                "eth.dst_resolved": "Broadcast",
+                "eth.lg": "1",
+                "eth.lg_raw": ["1", 0, 3, 131072, 2],
+            },
+            "eth.type": "0x0800",
+            "eth.type_raw": ["0800", 12, 2, 0, 5],
+        },
+    }
+    packet = packet_from_json_packet(_json_packet(layers))
+
+    eth = packet.eth
+    assert eth.raw == "ffffffffffff0800"
+    assert [field.properties['name'] for field in eth.fields] == ["eth.dst", "eth.type"]
+    assert eth.dst.value == "ff:ff:ff:ff:ff:ff"
+    assert eth.dst.raw == "ffffffffffff"
+    assert eth.type.raw == "0800"
+    assert [field.properties['name'] for field in eth.dst.fields] == ["eth.dst_resolved", "eth.lg"]
+    assert eth.dst.lg.raw == "1"
+
+
+def test_raw_value_without_its_field_is_kept_as_a_field():
+    packet = packet_from_json_packet(_json_packet({"ip": {"ip.opt_raw": ["01", 20, 1, 0, 1]}}))
+    assert [field.properties['name'] for field in packet.ip.fields] == ["ip.opt_raw"]
+
+
+def test_repeated_fields_without_raw_values():
+    packet = packet_from_json_packet(_json_packet({"dns": {"dns.a": ["10.0.0.1", "10.0.0.2"]}}))
+    assert [field.value for field in packet.dns.get_multiple_fields("a")] == ["10.0.0.1", "10.0.0.2"]
+
+
+def test_repeated_fields_get_their_own_raw_value_and_tree():
+    # tcp with two NOP options, from tshark -T json -x --no-duplicate-keys
+    tcp = {
+        "tcp.srcport": "443",
+        "tcp.options": "0101080a",
+        "tcp.options_raw": ["0101080a", 54, 4, 0, 30],
+        "tcp.options_tree": {
+            "tcp.options.nop": ["01", "01"],
+            "tcp.options.nop_raw": [["01", 54, 1, 0, 30], ["01", 55, 1, 0, 30]],
+            "tcp.options.nop_tree": [{"tcp.option_kind": "1", "tcp.option_kind_raw": ["01", 54, 1, 0, 4]},
+                                     {"tcp.option_kind": "1", "tcp.option_kind_raw": ["01", 55, 1, 0, 4]}],
+        },
+    }
+    packet = packet_from_json_packet(_json_packet({"tcp": tcp}))
+
+    options = _fields_named(packet.tcp, "tcp.options")[0]
+    assert options.raw == "0101080a"
+    assert [field.properties['name'] for field in options.fields] == ["tcp.options.nop", "tcp.options.nop"]
+    for nop in options.fields:
+        assert nop.value == "01"
+        assert nop.raw == "01"
+        assert [field.properties['name'] for field in nop.fields] == ["tcp.option_kind"]
+    assert [nop.fields[0].raw for nop in options.fields] == ["01", "01"]